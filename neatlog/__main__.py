@@ -0,0 +1,55 @@
+"""
+Command line tools for neatlog log files
+
+    python -m neatlog query LOGFILE [--level error] [--since 2025-09-15T18:00] [--until ...]
+    python -m neatlog index LOGFILE
+"""
+import argparse
+import datetime
+import sys
+
+from .index import buildIndex, query
+from .neatlog import getLoggingLevel
+
+
+def parseLevel(value):
+    level = getLoggingLevel(int(value) if value.isdigit() else value.lower())
+    if level is None:
+        raise argparse.ArgumentTypeError("invalid level '%s'"%value)
+    return level
+
+
+def parseTime(value):
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError("invalid time '%s', expected ISO format e.g. 2025-09-15T18:30:00"%value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m neatlog")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    queryParser = commands.add_parser("query", help="Print the records matching level and time. Uses the sidecar index if there is one.")
+    queryParser.add_argument("logFile")
+    queryParser.add_argument("--level", type=parseLevel, default=0, help="Minimum level, e.g. 'error'")
+    queryParser.add_argument("--since", type=parseTime, help="Earliest record time in ISO format")
+    queryParser.add_argument("--until", type=parseTime, help="Latest record time in ISO format")
+
+    indexParser = commands.add_parser("index", help="Rebuild the sidecar index of a log file")
+    indexParser.add_argument("logFile")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "index":
+        buildIndex(args.logFile)
+    else:
+        out = sys.stdout.buffer
+        for record in query(args.logFile, level=args.level, since=args.since, until=args.until):
+            out.write(record)
+        out.flush()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,421 @@
+"""
+Sidecar index for neatlog log files and the queries that use it.
+
+The index is made of two files next to the log file:
+
+`<log>.idx` holds one fixed-size entry per record: byte offset, byte length,
+creation time in whole seconds and the level.
+
+`<log>.idb` holds one bucket per minute: the minute, a bitmask of the levels
+in it and where its entries and records end (they start where the previous
+bucket ends). Queries binary search the buckets for `since` and skip buckets
+without a matching level. Regions of the log that were written without the
+index (e.g. before it was enabled) are stored as gap buckets and scanned.
+"""
+import datetime
+import logging
+import mmap
+import os
+import re
+import struct
+
+MAGIC = b"NLIX"
+VERSION = 2
+HEADER = struct.Struct("<4sB")
+# offset, length, seconds since epoch, level
+ENTRY = struct.Struct("<QIIB")
+# minute since epoch, levels, end of the entries, end of the records
+BUCKET = struct.Struct("<IBQQ")
+BUCKET_SECONDS = 60
+# Flag of buckets that mark a region that has to be scanned
+GAP = 0x80
+MAX_LENGTH = 0xFFFFFFFF
+MAX_LEVEL = 254
+
+# Matches the start of records written by the file handler's plain formatter
+RECORD_PATTERN = re.compile(rb"^(DEBUG|INFO|WARNING|ERROR|CRITICAL) *: .*? :: (\d\d):(\d\d):(\d\d)\.\d+ - ")
+# Log headers and date markers
+HEADER_START = b"---- "
+HEADER_DATE = re.compile(rb"^Date  : (\S+ \S+)")
+
+
+def indexPath(logPath):
+    """
+    Returns the path of the sidecar index of `logPath`
+    """
+    return os.fspath(logPath) + ".idx"
+
+
+def bucketPath(logPath):
+    """
+    Returns the path of the sidecar index buckets of `logPath`
+    """
+    return os.fspath(logPath) + ".idb"
+
+
+def _levelBit(levelno):
+    return 1 << min(levelno // 10, 6)
+
+
+def _levelMask(level):
+    """
+    Returns the bits of all levels that can be >= `level`
+    """
+    shift = min(level // 10, 6)
+    return (0x7F >> shift) << shift
+
+
+class IndexWriter(object):
+    """
+    Appends entries to the sidecar index of a log file.
+    Callers are expected to serialize calls to `add`.
+    """
+    def __init__(self, logPath, logSize, isNew=False):
+        """
+        Args:
+            logPath: Path to the log file
+            logSize: Current size of the log file
+            isNew: The log file was just created, any existing index is stale
+        """
+        self.path = indexPath(logPath)
+        self.bucketPath = bucketPath(logPath)
+        self.stream = None
+        self.buckets = None
+
+        if not isNew and logSize > 0 and _validHeader(self.path) and _validHeader(self.bucketPath):
+            self.stream = _reopen(self.path, ENTRY.size)
+            self.buckets = _reopen(self.bucketPath, BUCKET.size)
+            # An index that reaches past the end of the log belongs to a replaced (e.g. rotated) log
+            if not self._recover() or self.end > logSize:
+                self.close()
+                self.stream = None
+
+        if self.stream is None:
+            # New log or unusable index: start over
+            self._reset()
+            self.stream = _create(self.path)
+            self.buckets = _create(self.bucketPath)
+
+        # Whatever was logged without the index has to be scanned
+        if self.end < logSize:
+            self.addGap(logSize)
+
+    def _reset(self):
+        # Minute of the open (or last) bucket
+        self.minute = 0
+        # Levels in the open bucket
+        self.levels = 0
+        # Number of entries before the open bucket
+        self.first = 0
+        # Number of entries
+        self.count = 0
+        # Log offset after the last indexed region
+        self.end = 0
+
+    def _recover(self):
+        """
+        Restores the state from the existing files.
+        Entries without a bucket (e.g. the process was killed) go into the open bucket.
+
+        Returns:
+            False if the files don't match
+        """
+        self._reset()
+        count = (self.stream.tell() - HEADER.size) // ENTRY.size
+        if self.buckets.tell() > HEADER.size:
+            self.buckets.seek(-BUCKET.size, os.SEEK_END)
+            self.minute, _, self.first, self.end = BUCKET.unpack(self.buckets.read(BUCKET.size))
+            if self.first > count:
+                return False
+
+        self.count = self.first
+        self.stream.seek(HEADER.size + self.first * ENTRY.size)
+        for offset, length, seconds, levelno in _readEntries(self.stream):
+            self._track(offset + length, levelno, seconds)
+        return True
+
+    def add(self, offset, length, levelno, created):
+        """
+        Adds a record's entry
+        """
+        length = min(length, MAX_LENGTH)
+        self.stream.write(ENTRY.pack(offset, length, int(created), min(levelno, MAX_LEVEL)))
+        self._track(offset + length, levelno, int(created))
+
+    def _track(self, end, levelno, seconds):
+        minute = seconds // BUCKET_SECONDS
+        # Records that arrive late join the open bucket
+        if minute > self.minute:
+            self._closeBucket()
+            self.minute = minute
+        self.levels |= _levelBit(levelno)
+        self.count += 1
+        self.end = end
+
+    def _closeBucket(self):
+        if self.count > self.first:
+            self.buckets.write(BUCKET.pack(self.minute, self.levels, self.count, self.end))
+            self.first = self.count
+            self.levels = 0
+
+    def addGap(self, end):
+        """
+        Marks the region between the last indexed record and `end` as not indexed
+        """
+        self._closeBucket()
+        self.buckets.write(BUCKET.pack(self.minute, GAP, self.count, end))
+        self.end = end
+
+    def flush(self):
+        self.stream.flush()
+        self.buckets.flush()
+
+    def close(self):
+        if not self.stream.closed:
+            self._closeBucket()
+            self.stream.close()
+            self.buckets.close()
+
+
+def _create(path):
+    stream = open(path, 'wb')
+    stream.write(HEADER.pack(MAGIC, VERSION))
+    return stream
+
+
+def _reopen(path, entrySize):
+    """
+    Opens an index file for appending, dropping a partially written last entry
+    """
+    stream = open(path, 'r+b')
+    size = stream.seek(0, os.SEEK_END)
+    size -= (size - HEADER.size) % entrySize
+    stream.truncate(size)
+    stream.seek(size)
+    return stream
+
+
+def _validHeader(path):
+    if not os.path.exists(path) or os.path.getsize(path) < HEADER.size:
+        return False
+    with open(path, 'rb') as f:
+        magic, version = HEADER.unpack(f.read(HEADER.size))
+    return magic == MAGIC and version == VERSION
+
+
+def _localTime(value):
+    """
+    Converts aware datetimes to naive local time, the time zone records are logged in
+    """
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone().replace(tzinfo=None)
+    return value
+
+
+#------------------------------
+# QUERY
+#------------------------------
+def query(logPath, level=logging.NOTSET, since=None, until=None):
+    """
+    Yields the records of a log file matching level and time.
+    Uses the sidecar index if there is one, otherwise scans the whole file.
+    The index stores times in whole seconds, so `since` and `until` are too.
+
+    Args:
+        logPath: Path to the log file
+        level: Minimum logging level
+        since: datetime of the earliest record. Aware datetimes are converted to local time.
+        until: datetime of the latest record. Aware datetimes are converted to local time.
+
+    Returns:
+        Generator of records as bytes
+    """
+    logPath = os.fspath(logPath)
+    if os.path.getsize(logPath) == 0:
+        return
+    since = _localTime(since)
+    until = _localTime(until)
+
+    if not _validHeader(indexPath(logPath)) or not _validHeader(bucketPath(logPath)):
+        with open(logPath, 'rb') as f:
+            for record in _filter(scan(f), level, since, until):
+                yield record[3]
+        return
+
+    with open(logPath, 'rb') as logFile, \
+            open(indexPath(logPath), 'rb') as indexFile, \
+            open(bucketPath(logPath), 'rb') as bucketFile:
+        logMap = mmap.mmap(logFile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield from _queryIndex(logMap, indexFile, bucketFile, level, since, until)
+        finally:
+            logMap.close()
+
+
+def _queryIndex(logMap, indexFile, bucketFile, level, since, until):
+    sinceSec = None if since is None else int(since.timestamp())
+    untilSec = None if until is None else int(until.timestamp())
+    mask = _levelMask(level)
+
+    def matches(entries):
+        for offset, length, seconds, levelno in entries:
+            if levelno >= level \
+                    and (sinceSec is None or seconds >= sinceSec) \
+                    and (untilSec is None or seconds <= untilSec):
+                yield logMap[offset:offset + length]
+
+    def scanned(start, end, minute):
+        lastTime = datetime.datetime.fromtimestamp(minute * BUCKET_SECONDS) if minute else None
+        for record in _filter(scan(_mmapLines(logMap, start, end), start, lastTime), level, since, until):
+            yield record[3]
+
+    bucketCount = (os.fstat(bucketFile.fileno()).st_size - HEADER.size) // BUCKET.size
+    entryCount = (os.fstat(indexFile.fileno()).st_size - HEADER.size) // ENTRY.size
+
+    def bucket(i):
+        if i < 0:
+            return 0, 0, 0, 0
+        bucketFile.seek(HEADER.size + i * BUCKET.size)
+        return BUCKET.unpack(bucketFile.read(BUCKET.size))
+
+    # Records in a bucket aren't newer than its minute, so earlier buckets can be skipped.
+    # Gaps right before the first bucket may hold newer records.
+    first = 0
+    if sinceSec is not None:
+        first = _bisectBuckets(bucket, bucketCount, sinceSec // BUCKET_SECONDS)
+        while first > 0 and bucket(first - 1)[1] & GAP:
+            first -= 1
+
+    _, _, entries, end = bucket(first - 1)
+    for i in range(first, bucketCount):
+        minute, levels, nextEntries, nextEnd = bucket(i)
+        if nextEnd > len(logMap):
+            # Stale index, the log was truncated
+            return
+        # Leave room for records that arrived late
+        if untilSec is not None and minute > untilSec // BUCKET_SECONDS + 1:
+            return
+        if levels & GAP:
+            yield from scanned(end, nextEnd, minute)
+        elif levels & mask:
+            yield from matches(_readEntries(indexFile, entries, nextEntries))
+        entries, end = nextEntries, nextEnd
+
+    # Entries of the open bucket and records the index hasn't caught up with yet
+    lastMinute, _, entries, end = bucket(bucketCount - 1)
+    for entry in _readEntries(indexFile, entries, entryCount):
+        offset, length, seconds, _ = entry
+        if offset + length > len(logMap):
+            return
+        yield from matches([entry])
+        end = max(end, offset + length)
+        lastMinute = seconds // BUCKET_SECONDS
+    if end < len(logMap):
+        yield from scanned(end, len(logMap), lastMinute)
+
+
+def _bisectBuckets(bucket, count, minute):
+    """
+    Returns the index of the first bucket at or after `minute`
+    """
+    lo, hi = 0, count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if bucket(mid)[0] < minute:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+def buildIndex(logPath):
+    """
+    Rebuilds the sidecar index of `logPath` by scanning the log
+    """
+    writer = IndexWriter(logPath, 0, isNew=True)
+    try:
+        with open(logPath, 'rb') as f:
+            for offset, levelno, created, text in scan(f):
+                writer.add(offset, len(text), levelno, created.timestamp())
+    finally:
+        writer.close()
+
+
+def scan(lines, offset=0, lastTime=None):
+    """
+    Splits log lines into records. Dates are taken from the log headers and
+    date markers, since the records themselves only contain the time of day.
+    Between two of them, days are counted at midnight, which requires records
+    to be logged at least once a day. Logs written by neatlog versions without
+    date markers are only dated correctly if they were logged to continuously.
+    Without a header or `lastTime`, records are assumed to be from today.
+
+    Args:
+        lines: Iterable of lines as bytes
+        offset: Byte offset of the first line
+        lastTime: datetime of the record before the first line, if known
+
+    Returns:
+        Generator of (offset, levelno, created, text)
+    """
+    current = None
+    for line in lines:
+        match = RECORD_PATTERN.match(line)
+        if match or line.startswith(HEADER_START):
+            if current is not None:
+                yield current[0], current[1], current[2], b"".join(current[3])
+                current = None
+
+        if match:
+            timeOfDay = datetime.time(int(match.group(2)), int(match.group(3)), int(match.group(4)))
+            if lastTime is None:
+                lastTime = datetime.datetime.combine(datetime.date.today(), datetime.time())
+            created = datetime.datetime.combine(lastTime.date(), timeOfDay)
+            # Midnight passed since the last record
+            if created < lastTime.replace(microsecond=0):
+                created += datetime.timedelta(days=1)
+            lastTime = created
+            current = [offset, logging.getLevelName(match.group(1).decode()), created, [line]]
+        elif current is not None:
+            current[3].append(line)
+        else:
+            dateMatch = HEADER_DATE.match(line)
+            if dateMatch:
+                lastTime = datetime.datetime.fromisoformat(dateMatch.group(1).decode())
+        offset += len(line)
+
+    if current is not None:
+        yield current[0], current[1], current[2], b"".join(current[3])
+
+
+def _filter(records, level, since, until):
+    for record in records:
+        if record[1] >= level \
+                and (since is None or record[2] >= since.replace(microsecond=0)) \
+                and (until is None or record[2] <= until):
+            yield record
+
+
+def _readEntries(indexFile, start=None, end=None, chunkEntries=4096):
+    """
+    Yields the entries from `start` (or the current position) to `end` (or the end of the file)
+    """
+    if start is not None:
+        indexFile.seek(HEADER.size + start * ENTRY.size)
+    remaining = None if end is None else end - (start or 0)
+    while remaining is None or remaining > 0:
+        count = chunkEntries if remaining is None else min(chunkEntries, remaining)
+        chunk = indexFile.read(ENTRY.size * count)
+        # Ignore a partially written last entry
+        chunk = chunk[:len(chunk) - len(chunk) % ENTRY.size]
+        if not chunk:
+            return
+        if remaining is not None:
+            remaining -= len(chunk) // ENTRY.size
+        yield from ENTRY.iter_unpack(chunk)
+
+
+def _mmapLines(logMap, start, end):
+    logMap.seek(start)
+    while logMap.tell() < end:
+        yield logMap.readline()
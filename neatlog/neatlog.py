@@ -1,9 +1,32 @@
+import atexit
+import collections
 import datetime
+import functools
 import inspect
 import logging
+import operator
+import os
 import platform
+import sys
+import threading
+import time
+import weakref
 
-import colorlog
+try:
+    import colorlog
+except ImportError:
+    colorlog = None
+
+from .index import IndexWriter
+
+# colorlog already initializes colorama when it's imported
+try:
+    import colorama
+except ImportError:
+    colorama = None
+else:
+    if colorlog is None and sys.platform == "win32":
+        colorama.init(strip=False)
 
 
 class ContextFilter(logging.Filter):
@@ -42,7 +65,14 @@ class _Logger(logging.Logger):
         self._filePath = filePath
         self._useColor = color
         self._verbosity = verbosity
-        self._level = getLoggingLevel(level)
+        self._colorBackend = "neatlog"
+        self._level = getLoggingLevel(level if ENV_LEVEL is None else ENV_LEVEL)
+
+        # Histograms of LOG.timed spans by name
+        self._timings = {}
+        self._threshold = logging.NOTSET
+        # Per-thread buffers of the multi-threaded mode
+        self._threadBuffer = None
 
         # Add filters for equal indenting
         self.addFilter(ContextFilter())
@@ -52,7 +82,7 @@ class _Logger(logging.Logger):
 
         # Formatters
         self._consoleFormat = ""
-        self._consoleFormatter = colorlog.ColoredFormatter()
+        self._consoleFormatter = None
         self._consoleColors = {
             'DEBUG':    'cyan',
             'INFO':     'white',
@@ -60,7 +90,6 @@ class _Logger(logging.Logger):
             'ERROR':    'red',
             'CRITICAL': 'red,bg_white',
         }
-        self._consoleFormatter.log_colors = self._consoleColors
         plainFormatString = ["%(lvl)s : %(name)s :: %(asctime)s.%(msecs)d - %(funcName)s - %(lineno)d >> %(message)s","%H:%M:%S"]
         self._plainFormatter = logging.Formatter(plainFormatString[0], plainFormatString[1])
 
@@ -96,14 +125,16 @@ class _Logger(logging.Logger):
             self._consoleHandler.setLevel(self._level)
         else:
             self._consoleHandler.setLevel(999)
+        self._updateLogMethods()
 
-    def enableFileHandler(self, state, filePath=None):
+    def enableFileHandler(self, state, filePath=None, index=False):
         """
         Toggle the file handler on/off
 
         Args:
             state: True=on, False=off
             filePath: Specify the file path the file handler should write to
+            index: Maintain a sidecar index (`<filePath>.idx`) for `python -m neatlog query`
 
         Raises
             - ValueError: If filepath is not set before or provided here
@@ -115,6 +146,9 @@ class _Logger(logging.Logger):
             for handler in reversed(self.handlers):
                 if isinstance(handler,logging.FileHandler):
                     self.removeHandler(handler)
+                    # Give the shared writer back to the pool
+                    if isinstance(handler, _SharedFileHandler):
+                        handler.close()
             self._fileHandler = None
 
         elif state is True:
@@ -126,12 +160,6 @@ class _Logger(logging.Logger):
             if self._filePath is None:
                 raise ValueError("Filepath is not set. You need to set it with setFilePath before enabling the fileHandler.")
 
-            # Append header to file.
-            # TODO: Only add if file doesn't exist yet
-            tempfile = open(self._filePath, 'a')
-            tempfile.write(self.getHeader())
-            tempfile.close()
-
             # Check if there is already a FileHandler
             fhExists = False
             for h in self.handlers:
@@ -139,11 +167,15 @@ class _Logger(logging.Logger):
                     fhExists = True
                     break
             if fhExists is False:
-                self._fileHandler = logging.FileHandler(self._filePath)
+                # The header is only written if the pool creates a new file
+                self._fileHandler = _SharedFileHandler(self._filePath, header=self.getHeader)
                 self._fileHandler.setLevel(logging.DEBUG)
                 self._fileHandler.setFormatter(self._plainFormatter)
                 self.addHandler(self._fileHandler)
 
+            if index and isinstance(self._fileHandler, _SharedFileHandler):
+                self._fileHandler.enableIndex()
+
         else:
             raise ValueError("Invalid State. Can only be True or False")
 
@@ -176,6 +208,75 @@ class _Logger(logging.Logger):
         else:
             self._level = loggingLevel
             self._consoleHandler.setLevel(loggingLevel)
+            self._updateLogMethods()
+
+    def addHandler(self, hdlr):
+        super().addHandler(hdlr)
+        _watchLevel(hdlr).add(self)
+        self._updateLogMethods()
+
+    def removeHandler(self, hdlr):
+        threadBuffer = self._threadBuffer
+        if threadBuffer is None:
+            super().removeHandler(hdlr)
+        else:
+            # Write what's still buffered for the handler. Removing it while holding the flush lock
+            # makes sure no flush sees it half-removed, records queued later are dropped by flush.
+            with threadBuffer._flushLock:
+                threadBuffer.flush()
+                super().removeHandler(hdlr)
+        _watchLevel(hdlr).discard(self)
+        self._updateLogMethods()
+
+    def callHandlers(self, record):
+        threadBuffer = self._threadBuffer
+        if threadBuffer is None:
+            super().callHandlers(record)
+        else:
+            threadBuffer.handle(record)
+
+    def enableThreadBuffering(self, state, interval=0.1, maxBuffered=1000):
+        """
+        Toggle the multi-threaded mode.
+        Each thread formats its records into a buffer of its own and a single flusher thread
+        writes them to the handlers in timestamp order every `interval` seconds,
+        so logging threads never wait for a handler's lock.
+        Records show up with a delay of up to `interval`.
+        A thread that has `maxBuffered` records queued flushes them itself,
+        so threads that log faster than the flusher writes are slowed down instead of using up memory.
+
+        Args:
+            state: True=on, False=off
+            interval: Seconds between flushes
+            maxBuffered: Records a thread may queue before it has to flush
+
+        Raises
+            - ValueError: If state value type is not True or False
+        """
+        if state is True:
+            if self._threadBuffer is None:
+                self._threadBuffer = _ThreadBuffer(self, interval, maxBuffered)
+        elif state is False:
+            threadBuffer, self._threadBuffer = self._threadBuffer, None
+            if threadBuffer is not None:
+                threadBuffer.stop()
+        else:
+            raise ValueError("Invalid State. Can only be True or False")
+
+    def _updateLogMethods(self):
+        """
+        Replaces the log methods of levels that no handler would emit with a no-op
+        and restores the ones that became enabled again.
+        Runs whenever a handler is added or removed or its setLevel is called.
+        Call this after assigning a handler's `level` attribute directly.
+        """
+        levels = [h.level for h in self.handlers]
+        self._threshold = threshold = min(levels) if levels else logging.NOTSET
+        for methodName, level in LOG_METHODS.items():
+            if level < threshold:
+                setattr(self, methodName, _noop)
+            else:
+                self.__dict__.pop(methodName, None)
 
     def setVerbosity(self, level):
         """
@@ -221,13 +322,428 @@ class _Logger(logging.Logger):
         chStr += " >> "
         chStr += "%(message)s"
 
-        if self._useColor:
+        if self._useColor and self._colorBackend == "colorlog":
             self._consoleFormatter = colorlog.ColoredFormatter(chStr, log_colors=self._consoleColors)
+        elif self._useColor:
+            self._consoleFormatter = ColorFormatter(chStr, log_colors=self._consoleColors)
         else:
             self._consoleFormatter = logging.Formatter(chStr)
 
         self._consoleHandler.setFormatter(self._consoleFormatter)
 
+    def setColors(self, colors):
+        """
+        Set the console colors per level name, e.g. {'DEBUG': 'cyan', 'CRITICAL': 'red,bg_white'}
+
+        Args:
+            colors: dict of level name to comma separated color names
+
+        Raises:
+            - ValueError: If a color name is unknown
+        """
+        consoleColors = dict(self._consoleColors)
+        consoleColors.update(colors)
+        # Fail before anything changes
+        for color in consoleColors.values():
+            parseColors(color)
+        self._consoleColors = consoleColors
+        self.setVerbosity(self._verbosity)
+
+    def setColorBackend(self, backend):
+        """
+        Set what renders the console colors:
+
+        - "neatlog": Built-in, precomputed escape codes (default)
+        - "colorlog": colorlog.ColoredFormatter, if colorlog is installed
+
+        Raises:
+            - ValueError: If the backend is unknown or not installed
+        """
+        if backend not in ("neatlog", "colorlog"):
+            raise ValueError("Invalid color backend '%s'"%backend)
+        if backend == "colorlog" and colorlog is None:
+            raise ValueError("The colorlog backend requires the colorlog module to be installed")
+        self._colorBackend = backend
+        self.setVerbosity(self._verbosity)
+
+    def timed(self, name, level="debug", interval=60.0):
+        """
+        Measures the duration of a block or function and aggregates it into a histogram.
+        Instead of one record per call, one summary record with count, p50, p95, p99 and max
+        is logged per `interval` and by flushTimings.
+        A background thread logs the summaries of spans that went idle within about a second
+        after their interval ended, pending summaries are logged at exit.
+
+        Use as context manager or decorator:
+
+            with LOG.timed("query"):
+                ...
+
+            @LOG.timed("handleRequest")
+            def handleRequest(): ...
+
+        Args:
+            name: Name of the span. Spans with the same name share one histogram.
+            level: Level of the summary records. Nothing is measured while it's disabled.
+            interval: Seconds between summaries. The first call with `name` sets level and interval.
+
+        Returns:
+            _Timer
+        """
+        histogram = self._timings.get(name)
+        if histogram is None:
+            loggingLevel = getLoggingLevel(level)
+            if loggingLevel is None:
+                raise ValueError("Invalid logging level '%s'"%level)
+            histogram = self._timings.setdefault(name, _Histogram(name, loggingLevel, interval))
+            _watchTimings(self)
+        return _Timer(self, histogram)
+
+    def flushTimings(self):
+        """
+        Logs the summaries of all timed spans recorded since the last summary
+        """
+        for histogram in list(self._timings.values()):
+            self._logTimings(histogram, histogram.reset())
+
+    def _flushDueTimings(self, now):
+        """
+        Logs the summaries of timed spans whose interval has ended
+        """
+        for histogram in list(self._timings.values()):
+            self._logTimings(histogram, histogram.resetIfDue(now))
+
+    def _logTimings(self, histogram, summary):
+        if summary is None:
+            return
+        count, p50, p95, p99, maximum = summary
+        self.log(histogram.level, "%s: count=%d p50=%s p95=%s p99=%s max=%s",
+                 histogram.name, count, formatDuration(p50), formatDuration(p95), formatDuration(p99), formatDuration(maximum))
+
+#------------------------------
+# COLORS
+#------------------------------
+def _esc(*codes):
+    return "\033[" + ";".join(codes) + "m"
+
+# Same names and codes as colorlog's escape_codes
+ESCAPE_CODES = {"reset": _esc("0"), "bold": _esc("01"), "thin": _esc("02")}
+for _prefix, _prefixName in [
+    ("3", ""),
+    ("01;3", "bold_"),
+    ("02;3", "thin_"),
+    ("3", "fg_"),
+    ("01;3", "fg_bold_"),
+    ("02;3", "fg_thin_"),
+    ("4", "bg_"),
+    ("10", "bg_bold_"),
+]:
+    for _code, _name in enumerate(["black", "red", "green", "yellow", "blue", "purple", "cyan", "white"]):
+        ESCAPE_CODES[_prefixName + _name] = _esc(_prefix + str(_code))
+del _prefix, _prefixName, _code, _name
+
+def parseColors(colors):
+    """
+    Returns the escape codes for comma separated color names, e.g. 'red,bg_white'
+
+    Raises:
+        - ValueError: If a color name is unknown
+    """
+    try:
+        return "".join(ESCAPE_CODES[name] for name in colors.split(",") if name)
+    except KeyError as e:
+        raise ValueError("Invalid color %s"%e)
+
+def getColorSupport(stream=None):
+    """
+    Returns whether `stream` (defaults to stderr) can display colors.
+    Setting the NO_COLOR environment variable turns colors off.
+    """
+    if os.environ.get("NO_COLOR"):
+        return False
+    stream = sys.stderr if stream is None else stream
+    isatty = getattr(stream, "isatty", None)
+    try:
+        return bool(isatty and isatty())
+    except ValueError:
+        # Closed stream
+        return False
+
+COLOR_SUPPORT = getColorSupport()
+
+
+class ColorFormatter(logging.Formatter):
+    """
+    Replaces %(log_color)s with the record level's escape codes and resets the color at the end.
+    The escape codes are baked into one format string per level when the formatter is created,
+    so formatting a record is plain string substitution.
+    """
+    def __init__(self, fmt=None, datefmt=None, log_colors=None, reset=True, useColor=None):
+        super().__init__(fmt, datefmt)
+        if useColor is None:
+            useColor = COLOR_SUPPORT
+
+        self.log_colors = dict(log_colors or {})
+        self._reset = ESCAPE_CODES["reset"] if reset and useColor else ""
+        self._defaultStyle = logging.PercentStyle(self._fmt.replace("%(log_color)s", ""))
+        self._levelStyles = {}
+        for levelName, colors in self.log_colors.items():
+            prefix = parseColors(colors) if useColor else ""
+            levelFmt = self._fmt.replace("%(log_color)s", prefix.replace("%", "%%"))
+            self._levelStyles[levelName] = logging.PercentStyle(levelFmt)
+
+    def formatMessage(self, record):
+        return self._levelStyles.get(record.levelname, self._defaultStyle).format(record)
+
+    def format(self, record):
+        message = super().format(record)
+        if self._reset and not message.endswith(self._reset):
+            message += self._reset
+        return message
+
+
+#------------------------------
+# TIMING
+#------------------------------
+class _Histogram(object):
+    """
+    Fixed-bucket histogram of durations in nanoseconds.
+    Every power of two is split into 4 buckets, so percentiles are off by less than 25%.
+    """
+    def __init__(self, name, level, interval):
+        self.name = name
+        self.level = level
+        self.intervalNs = int(interval * 1e9)
+        self.lock = threading.Lock()
+        self.counts = [0] * 256
+        self.count = 0
+        self.max = 0
+        self.started = time.perf_counter_ns()
+
+    def add(self, duration, now):
+        """
+        Adds a duration.
+
+        Returns:
+            The summary if the interval has passed, otherwise None
+        """
+        bits = duration.bit_length()
+        bucket = duration if bits < 3 else ((bits - 2) << 2) | ((duration >> (bits - 3)) & 3)
+        with self.lock:
+            self.counts[bucket] += 1
+            self.count += 1
+            if duration > self.max:
+                self.max = duration
+            if now - self.started < self.intervalNs:
+                return None
+            # Swap in the same critical section, so only one thread gets the summary
+            interval = self._swap(now)
+        return _summarize(*interval)
+
+    def resetIfDue(self, now):
+        """
+        Starts a new interval if the current one has ended
+
+        Returns:
+            The summary of the ended interval or None
+        """
+        with self.lock:
+            if now - self.started < self.intervalNs:
+                return None
+            interval = self._swap(now)
+        return _summarize(*interval)
+
+    def reset(self, now=None):
+        """
+        Starts a new interval
+
+        Returns:
+            (count, p50, p95, p99, max) of the past interval or None if it's empty
+        """
+        with self.lock:
+            interval = self._swap(time.perf_counter_ns() if now is None else now)
+        return _summarize(*interval)
+
+    def _swap(self, now):
+        """
+        Replaces the counts with empty ones. Callers are expected to hold `lock`.
+
+        Returns:
+            (counts, count, max) of the past interval
+        """
+        interval = (self.counts, self.count, self.max)
+        self.counts = [0] * 256
+        self.count = 0
+        self.max = 0
+        self.started = now
+        return interval
+
+
+def _summarize(counts, count, maximum):
+    """
+    Returns (count, p50, p95, p99, max) of histogram counts or None if they're empty
+    """
+    if count == 0:
+        return None
+
+    percentiles = []
+    targets = [count * 0.50, count * 0.95, count * 0.99]
+    seen = 0
+    for bucket, bucketCount in enumerate(counts):
+        seen += bucketCount
+        while targets and seen >= targets[0]:
+            targets.pop(0)
+            percentiles.append(min(_bucketBound(bucket), maximum))
+        if not targets:
+            break
+    return (count, percentiles[0], percentiles[1], percentiles[2], maximum)
+
+
+# Loggers with timed spans, for the thread that logs summaries of idle spans and for the exit hook
+_TIMED_LOGGERS = weakref.WeakSet()
+_TIMED_LOGGERS_LOCK = threading.Lock()
+_timingsThread = None
+# Seconds between checks for summaries of idle spans
+TIMINGS_CHECK_INTERVAL = 1.0
+
+def _watchTimings(logger):
+    """
+    Makes sure the summaries of `logger` are logged when idle and at exit
+    """
+    global _timingsThread
+    with _TIMED_LOGGERS_LOCK:
+        _TIMED_LOGGERS.add(logger)
+        if _timingsThread is None:
+            _timingsThread = threading.Thread(target=_runTimings, name="neatlog-timings", daemon=True)
+            _timingsThread.start()
+            atexit.register(_flushTimings)
+
+def _runTimings():
+    while True:
+        time.sleep(TIMINGS_CHECK_INTERVAL)
+        _flushTimings(due=True)
+
+def _flushTimings(due=False):
+    """
+    Logs the pending summaries of all loggers with timed spans
+
+    Args:
+        due: Only log the summaries whose interval has ended
+    """
+    now = time.perf_counter_ns()
+    with _TIMED_LOGGERS_LOCK:
+        loggers = list(_TIMED_LOGGERS)
+    for logger in loggers:
+        if due:
+            logger._flushDueTimings(now)
+        else:
+            logger.flushTimings()
+
+
+def _bucketBound(bucket):
+    """
+    Returns the largest duration that falls into `bucket`
+    """
+    if bucket < 4:
+        return bucket
+    shift = (bucket >> 2) - 1
+    return ((5 + (bucket & 3)) << shift) - 1
+
+
+class _Timer(object):
+    """
+    Context manager and decorator returned by _Logger.timed.
+    A single instance must not be entered by several threads at once, use one `timed` call each.
+    """
+    __slots__ = ("_logger", "_histogram", "_start")
+
+    def __init__(self, logger, histogram):
+        self._logger = logger
+        self._histogram = histogram
+        self._start = 0
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        now = time.perf_counter_ns()
+        histogram = self._histogram
+        if histogram.level >= self._logger._threshold:
+            summary = histogram.add(now - self._start, now)
+            if summary is not None:
+                self._logger._logTimings(histogram, summary)
+
+    def __call__(self, func):
+        logger = self._logger
+        histogram = self._histogram
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if histogram.level < logger._threshold:
+                return func(*args, **kwargs)
+            start = time.perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                now = time.perf_counter_ns()
+                summary = histogram.add(now - start, now)
+                if summary is not None:
+                    logger._logTimings(histogram, summary)
+        return wrapper
+
+
+def formatDuration(ns):
+    """
+    Returns a short human readable duration, e.g. '850ns', '12.3us', '4.56ms', '2.1s'
+    """
+    if ns < 1000:
+        return "%dns"%ns
+    if ns < 1000000:
+        return "%.3gus"%(ns / 1e3)
+    if ns < 1000000000:
+        return "%.3gms"%(ns / 1e6)
+    return "%.3gs"%(ns / 1e9)
+
+
+def _watchLevel(handler):
+    """
+    Makes `handler.setLevel` update the log methods of the loggers it's added to
+
+    Returns:
+        WeakSet of the loggers to update
+    """
+    loggers = handler.__dict__.get("_neatlogLoggers")
+    if loggers is None:
+        loggers = handler._neatlogLoggers = weakref.WeakSet()
+        setLevel = handler.setLevel
+
+        def watchedSetLevel(level):
+            setLevel(level)
+            for logger in list(loggers):
+                logger._updateLogMethods()
+
+        handler.setLevel = watchedSetLevel
+    return loggers
+
+
+def _noop(*args, **kwargs):
+    """
+    Stand-in for the log methods of disabled levels
+    """
+
+# Log methods that get swapped for _noop, with the level they log at
+LOG_METHODS = {
+    "debug"     : logging.DEBUG,
+    "info"      : logging.INFO,
+    "warning"   : logging.WARNING,
+    "warn"      : logging.WARNING,
+    "error"     : logging.ERROR,
+    "exception" : logging.ERROR,
+    "critical"  : logging.CRITICAL,
+    "fatal"     : logging.CRITICAL,
+}
+
 def getLoggingLevel(levelName):
     """
     Returns the levelName's corresponding logging level enum
@@ -259,6 +775,21 @@ def getLoggingLevel(levelName):
 
     return loggingLevel
 
+def getEnvLevel():
+    """
+    Returns the logging level set with the NEATLOG_LEVEL environment variable.
+    It overrides the level passed to getLogger.
+
+    Returns:
+        The logging level or None if the variable is unset or invalid
+    """
+    value = os.environ.get("NEATLOG_LEVEL", "").strip().lower()
+    if value.isdigit():
+        value = int(value)
+    return getLoggingLevel(value)
+
+ENV_LEVEL = getEnvLevel()
+
 def getParentScript(top=False):
     """
     !! DEPRECATED FUNCTION - WILL BE REMOVED IN A FUTURE VERSION !!
@@ -327,3 +858,326 @@ def getLogger(name, level='error', filePath=None, color=True, verbosity=10):
         newLogger = _Logger(name, level, filePath, color, verbosity)
         logger = MANAGER.register(name, newLogger)
     return logger
+
+#------------------------------
+# FILE POOL
+#------------------------------
+class _FileWriter(object):
+    """
+    A single buffered stream shared by all handlers writing to the same file.
+    Keeps track of the byte offset to maintain the optional sidecar index.
+    Records only contain the time of day, so a date marker is written before
+    the first record of each day and the first record after opening the file.
+    """
+    def __init__(self, path, header=None, encoding="utf-8"):
+        self.path = path
+        self.refs = 0
+        self.lock = threading.RLock()
+        self.encoding = encoding
+        self.index = None
+        # Range of the day of the last date marker as timestamps
+        self._dayStart = self._dayEnd = 0.0
+
+        # Only files that are new (or empty) get a header
+        self.isNew = isNew = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.stream = open(path, 'ab')
+        self.offset = os.path.getsize(path)
+        if isNew and header is not None:
+            self.write(header() if callable(header) else header)
+
+    def enableIndex(self):
+        """
+        Starts maintaining the sidecar index of the file
+        """
+        with self.lock:
+            if self.index is None:
+                self.index = IndexWriter(self.path, self.offset, isNew=self.isNew)
+
+    def write(self, text, levelno=None, created=None):
+        """
+        Writes text to the file. Callers are expected to hold `lock`.
+
+        Args:
+            text: The text to write
+            levelno: Level of the record in `text`. Only records are indexed.
+            created: Creation time of the record in `text`
+        """
+        self._write(text, levelno, created)
+        self.stream.flush()
+
+    def writeMany(self, entries):
+        """
+        Writes several records at once. Callers are expected to hold `lock`.
+
+        Args:
+            entries: Iterable of (text, levelno, created)
+        """
+        for text, levelno, created in entries:
+            self._write(text, levelno, created)
+        self.stream.flush()
+
+    def _write(self, text, levelno, created):
+        if created is not None and not self._dayStart <= created < self._dayEnd:
+            self._writeDate(created)
+        data = text.encode(self.encoding, "backslashreplace")
+        self.stream.write(data)
+        if self.index is not None and levelno is not None:
+            self.index.add(self.offset, len(data), levelno, created)
+        self.offset += len(data)
+
+    def _writeDate(self, created):
+        date = datetime.datetime.fromtimestamp(created)
+        day = datetime.datetime.combine(date.date(), datetime.time())
+        self._dayStart = day.timestamp()
+        self._dayEnd = (day + datetime.timedelta(days=1)).timestamp()
+        self._write("---- DATE ----\nDate  : %s\n"%date, None, None)
+
+    def flush(self):
+        """
+        Flushes the stream
+        """
+        with self.lock:
+            if not self.stream.closed:
+                self.stream.flush()
+                if self.index is not None:
+                    self.index.flush()
+
+    def close(self):
+        """
+        Closes the stream
+        """
+        with self.lock:
+            if not self.stream.closed:
+                self.stream.flush()
+                self.stream.close()
+            if self.index is not None:
+                self.index.close()
+
+
+class FilePool(object):
+    """
+    Hands out one reference-counted writer per resolved file path
+    """
+    def __init__(self):
+        self.writers = {}
+        self._lock = threading.Lock()
+
+    def get(self, filePath):
+        """
+        Returns the open writer for `filePath` or None
+        """
+        return self.writers.get(resolvePath(filePath))
+
+    def acquire(self, filePath, header=None, index=False):
+        """
+        Returns the writer for `filePath`, opening the file if nobody has yet.
+
+        Args:
+            filePath: Path to the log file
+            header: String or callable returning the header. Only written if the file is new.
+            index: Maintain the file's sidecar index
+
+        Returns:
+            The shared _FileWriter
+        """
+        path = resolvePath(filePath)
+        with self._lock:
+            writer = self.writers.get(path)
+            if writer is None:
+                writer = _FileWriter(path, header=header)
+                self.writers[path] = writer
+            writer.refs += 1
+        if index:
+            writer.enableIndex()
+        return writer
+
+    def release(self, writer):
+        """
+        Drops a reference to `writer` and closes it once nobody uses it anymore
+        """
+        with self._lock:
+            writer.refs -= 1
+            if writer.refs > 0:
+                return
+            if self.writers.get(writer.path) is writer:
+                del self.writers[writer.path]
+        writer.close()
+
+FILE_POOL = FilePool()
+
+
+class _SharedFileHandler(logging.FileHandler):
+    """
+    FileHandler that writes through the FILE_POOL instead of opening its own stream.
+    All handlers of the same file share one stream and one lock.
+    """
+    def __init__(self, filename, header=None):
+        # delay=True stops FileHandler from opening a stream of its own
+        super().__init__(filename, delay=True)
+        self._writer = FILE_POOL.acquire(filename, header=header)
+        self.lock = self._writer.lock
+
+    def enableIndex(self):
+        """
+        Starts maintaining the sidecar index of the file
+        """
+        self._writer.enableIndex()
+
+    def emit(self, record):
+        try:
+            self._writer.write(self.format(record) + self.terminator, record.levelno, record.created)
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        if self._writer is not None:
+            self._writer.flush()
+
+    def close(self):
+        with self.lock:
+            writer, self._writer = self._writer, None
+            super().close()
+        if writer is not None:
+            FILE_POOL.release(writer)
+
+
+#------------------------------
+# THREAD BUFFERS
+#------------------------------
+class _ThreadBuffer(object):
+    """
+    Lets every thread format records into a queue of its own.
+    A single flusher thread merges the queues in timestamp order and writes them to the handlers in batches.
+    """
+    def __init__(self, logger, interval, maxBuffered):
+        self._logger = logger
+        self._interval = interval
+        self._maxBuffered = maxBuffered
+        self._local = threading.local()
+        # (thread, queue) of every thread that logged
+        self._queues = []
+        self._queuesLock = threading.Lock()
+        self._flushLock = threading.RLock()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="neatlog-flusher", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def handle(self, record):
+        """
+        Formats the record for every handler it passes and queues it
+        """
+        try:
+            queue = self._local.queue
+        except AttributeError:
+            queue = self._register()
+
+        for handler in self._logger.handlers:
+            if record.levelno >= handler.level and handler.filter(record):
+                try:
+                    msg = handler.format(record)
+                except Exception:
+                    handler.handleError(record)
+                    continue
+                # deque.append is atomic, no lock needed
+                queue.append((record.created, handler, msg, record))
+
+        # Logged while stopping, nobody else will flush this.
+        # Or the flusher can't keep up: write it here, which slows this thread down.
+        if self._stopped.is_set() or len(queue) >= self._maxBuffered:
+            self.flush()
+
+    def _register(self):
+        queue = collections.deque()
+        self._local.queue = queue
+        with self._queuesLock:
+            self._queues.append((threading.current_thread(), queue))
+        return queue
+
+    def _run(self):
+        while not self._stopped.wait(self._interval):
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all queued records to their handlers
+        """
+        with self._flushLock:
+            with self._queuesLock:
+                queues = list(self._queues)
+
+            entries = []
+            for thread, queue in queues:
+                while True:
+                    try:
+                        entries.append(queue.popleft())
+                    except IndexError:
+                        break
+
+            # Forget threads that are gone
+            with self._queuesLock:
+                self._queues = [(t, q) for t, q in self._queues if t.is_alive() or q]
+
+            if not entries:
+                return
+
+            # Stable sort keeps each thread's order for equal times
+            entries.sort(key=operator.itemgetter(0))
+            batches = {}
+            handlers = set(self._logger.handlers)
+            for created, handler, msg, record in entries:
+                # Queued by a thread that picked up the handler just before it was removed
+                if handler not in handlers:
+                    continue
+                batches.setdefault(handler, []).append((msg, record))
+            for handler, batch in batches.items():
+                _writeBatch(handler, batch)
+
+    def stop(self):
+        """
+        Stops the flusher thread and writes what's left
+        """
+        self._stopped.set()
+        if self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.flush()
+        atexit.unregister(self.stop)
+
+
+def _writeBatch(handler, batch):
+    """
+    Writes preformatted (msg, record) pairs to `handler` while holding its lock once
+    """
+    handler.acquire()
+    try:
+        if isinstance(handler, _SharedFileHandler):
+            # Closed without being removed from the logger
+            if handler._writer is None:
+                return
+            handler._writer.writeMany(
+                (msg + handler.terminator, record.levelno, record.created) for msg, record in batch
+            )
+        elif type(handler) is logging.StreamHandler:
+            handler.stream.write("".join(msg + handler.terminator for msg, record in batch))
+            handler.flush()
+        else:
+            # Only the handler itself knows how to emit
+            for msg, record in batch:
+                handler.emit(record)
+    except Exception:
+        handler.handleError(batch[-1][1])
+    finally:
+        handler.release()
+
+
+def resolvePath(filePath):
+    """
+    Returns the absolute path of `filePath` with symlinks resolved
+
+    Args:
+        filePath: str or path-like
+
+    Returns:
+        The resolved path as str
+    """
+    return os.path.realpath(os.fspath(filePath))
@@ -3,9 +3,15 @@
 # info: Demonstration of how to use neatlog
 #==============================
 import neatlog
-from neatlog import colorlog
+import colorlog
+import datetime
+import itertools
 import logging
+import os
+import tempfile
+import threading
 import time
+import timeit
 
 def test():
     one()
@@ -87,7 +93,104 @@ if __name__ == '__main__':
     nlFinalTime /= samples
     test()
 
+    # Disabled level vs. empty function
+    def empty(*args, **kwargs):
+        pass
+    disabledIterations = 1000000
+    LOG = neatlog.getLogger("neatlog_disabled", level='error', color=False)
+    emptyTime = min(timeit.repeat(lambda: empty('x %s', iterations), number=disabledIterations, repeat=samples))
+    disabledTime = min(timeit.repeat(lambda: LOG.debug('x %s', iterations), number=disabledIterations, repeat=samples))
+    std = logging.getLogger("logging_disabled")
+    std.setLevel(logging.ERROR)
+    stdDisabledTime = min(timeit.repeat(lambda: std.debug('x %s', iterations), number=disabledIterations, repeat=samples))
+
+    # Timed spans vs. manual timing
+    spanIterations = 100000
+    LOG = neatlog.getLogger("neatlog_timed", level='debug', color=False)
+    LOG._consoleHandler.setStream(open(os.devnull, "w"))
+    def bare():
+        pass
+    def spanned():
+        with LOG.timed("span"):
+            pass
+    @LOG.timed("decorated")
+    def decorated():
+        pass
+    def manual():
+        start = time.time()
+        LOG.info("span took %s", time.time() - start)
+    bareTime = min(timeit.repeat(bare, number=spanIterations, repeat=samples))
+    spanTime = min(timeit.repeat(spanned, number=spanIterations, repeat=samples))
+    decoratedTime = min(timeit.repeat(decorated, number=spanIterations, repeat=samples))
+    manualTime = min(timeit.repeat(manual, number=spanIterations, repeat=samples))
+
+    timedCount = LOG._timings["span"].count + LOG._timings["decorated"].count
+    LOG.flushTimings()
+
+    # Threads: direct handlers vs. per-thread buffers
+    threadRecords = 64000
+    threadTimes = []
+    threadLogPath = os.path.join(tempfile.mkdtemp(), "speedTest.log")
+    for withFile, buffered, threadCount in itertools.product([False, True], [False, True], [1, 4, 16, 64]):
+        LOG = neatlog.getLogger("neatlog_threads_%s_%s_%s"%(withFile, buffered, threadCount), level='info', color=False)
+        LOG._consoleHandler.setStream(open(os.devnull, "w"))
+        if withFile:
+            LOG.enableFileHandler(True, threadLogPath)
+        LOG.enableThreadBuffering(buffered)
+        def work():
+            for i in range(0, threadRecords // threadCount):
+                LOG.info('test')
+        threads = [threading.Thread(target=work) for i in range(0, threadCount)]
+        thStartTime = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Include writing what's left in the buffers
+        LOG.enableThreadBuffering(False)
+        threadTimes.append((withFile, buffered, threadCount, time.time()-thStartTime))
+        LOG.enableFileHandler(False)
+
+    # Log queries: scan vs. sidecar index
+    queryRecords = 1000000
+    queryLogPath = os.path.join(tempfile.mkdtemp(), "speedTestQuery.log")
+    LOG = neatlog.getLogger("neatlog_query", level='debug', color=False)
+    LOG.enableConsoleHandler(False)
+    LOG.enableFileHandler(True, queryLogPath, index=True)
+    queryStart = time.time() - queryRecords * 0.1
+    for i in range(0, queryRecords):
+        record = LOG.makeRecord(LOG.name, logging.ERROR if i % 1000 == 0 else logging.INFO, __file__, 1, 'test %s', (i,), None)
+        record.created = queryStart + i * 0.1
+        LOG.handle(record)
+    LOG.enableFileHandler(False)
+    lastHour = datetime.datetime.fromtimestamp(time.time() - 3600)
+    def runQuery(**kwargs):
+        for record in neatlog.index.query(queryLogPath, **kwargs):
+            pass
+    queryTimes = []
+    for name, kwargs in [("--level error", {"level": logging.ERROR}), ("--since <last hour>", {"since": lastHour})]:
+        indexedTime = min(timeit.repeat(lambda: runQuery(**kwargs), number=1, repeat=samples))
+        queryTimes.append((name, "index", indexedTime))
+    for path in [neatlog.index.indexPath(queryLogPath), neatlog.index.bucketPath(queryLogPath)]:
+        os.rename(path, path + ".off")
+    for name, kwargs in [("--level error", {"level": logging.ERROR}), ("--since <last hour>", {"since": lastHour})]:
+        scanTime = min(timeit.repeat(lambda: runQuery(**kwargs), number=1, repeat=samples))
+        queryTimes.append((name, "scan ", scanTime))
+
     # RESULTS
     print("'logging'  logged %s logs in %s seconds on average"%(iterations, lgFinalTime))
     print("'colorlog' logged %s logs in %s seconds on average"%(iterations, clFinalTime))
     print("'neatlog'  logged %s logs in %s seconds on average"%(iterations, nlFinalTime))
+    print("empty function      called %s times in %s seconds"%(disabledIterations, emptyTime))
+    print("'neatlog'  disabled called %s times in %s seconds"%(disabledIterations, disabledTime))
+    print("'logging'  disabled called %s times in %s seconds"%(disabledIterations, stdDisabledTime))
+    print("bare function       called %s times in %s seconds"%(spanIterations, bareTime))
+    print("'neatlog'  timed    called %s times in %s seconds"%(spanIterations, spanTime))
+    print("'neatlog'  decorated called %s times in %s seconds"%(spanIterations, decoratedTime))
+    print("timed spans recorded: %s"%timedCount)
+    print("manual time+LOG.info called %s times in %s seconds"%(spanIterations, manualTime))
+    for name, method, qFinalTime in queryTimes:
+        print("'neatlog'  %s query %s of %s records in %s seconds"%(method, name, queryRecords, qFinalTime))
+    for withFile, buffered, threadCount, thFinalTime in threadTimes:
+        print("'neatlog'  %s %s %2s threads logged %s logs in %s seconds"%(
+            "console + file" if withFile else "console       ", "buffered" if buffered else "direct  ", threadCount, threadRecords, thFinalTime))
@@ -1,5 +1,7 @@
 import datetime
+import json
 import logging
+import sys
 from pathlib import Path
 
 import pytest
@@ -106,4 +108,14 @@ def f_file_path(tmp_path, f_file_name) -> Path:
 
 @pytest.fixture
 def f_message() -> str:
-    return "something something loggy McLogFace"
\ No newline at end of file
+    return "something something loggy McLogFace"
+
+
+@pytest.fixture
+def f_allocation_budget() -> dict:
+    with open(Path(__file__).parent / "allocation_budget.json") as f:
+        budgets = json.load(f)
+    version = "%s.%s"%sys.version_info[:2]
+    if version not in budgets:
+        pytest.skip("No allocation budgets recorded for Python %s"%version)
+    return budgets[version]
@@ -0,0 +1,112 @@
+"""
+Allocation budgets of a single LOG.debug call.
+
+`peak_bytes` is the most memory a call allocates at once, `retained_bytes` what it keeps per call.
+Both come from tracemalloc, minus what calling an empty function with the same arguments takes.
+`blocks` counts the memory blocks a call has allocated and still holds once its handlers have run,
+e.g. the record, its attributes and the formatted message.
+allocation_budget.json holds budgets per Python version, recorded plus ~25% headroom.
+Versions without recorded budgets are skipped.
+"""
+import logging
+import statistics
+import sys
+import tracemalloc
+
+import pytest
+
+import neatlog
+
+CALLS = 200
+
+
+class NullStream:
+    def write(self, text):
+        pass
+
+    def flush(self):
+        pass
+
+
+def empty(*args, **kwargs):
+    pass
+
+
+def measure(func, logger=None):
+    """
+    Returns peak bytes, retained bytes and blocks per call of `func`.
+    Blocks are only counted for calls that reach the handlers of `logger`.
+    """
+    # Preallocated, so that collecting the counts doesn't allocate
+    blocks = [None] * CALLS
+    state = [0, 0]
+    if logger is not None:
+        callHandlers = logger.callHandlers
+        def probe(record):
+            callHandlers(record)
+            blocks[state[1]] = sys.getallocatedblocks() - state[0]
+        logger.callHandlers = probe
+
+    try:
+        # Warm up caches, lazily created attributes and so on
+        for i in range(50):
+            func()
+
+        tracemalloc.start()
+        try:
+            for i in range(CALLS):
+                state[1] = i
+                state[0] = sys.getallocatedblocks()
+                func()
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    finally:
+        if logger is not None:
+            del logger.callHandlers
+    blocks = [b for b in blocks if b is not None]
+    return peak, current / CALLS, statistics.median(blocks) if blocks else 0
+
+
+@pytest.mark.skipif(sys.implementation.name != "cpython", reason="Budgets are recorded with CPython")
+@pytest.mark.parametrize(
+    ["budget_key", "f_level", "verbosity", "color_on", "file_on"],
+    [
+        ["suppressed",   logging.ERROR, 10, False, False],
+        ["verbosity_0",  logging.DEBUG, 0,  False, False],
+        ["verbosity_10", logging.DEBUG, 10, False, False],
+        ["verbosity_20", logging.DEBUG, 20, False, False],
+        ["verbosity_30", logging.DEBUG, 30, False, False],
+        ["verbosity_40", logging.DEBUG, 40, False, False],
+        ["color",        logging.DEBUG, 10, True,  False],
+        ["file",         logging.DEBUG, 10, False, True],
+    ]
+)
+def test_debug_allocations(
+        monkeypatch,
+        f_file_path,
+        f_message,
+        f_allocation_budget,
+        f_logger,
+        budget_key,
+        verbosity,
+        color_on,
+        file_on,
+):
+    monkeypatch.setattr(neatlog.neatlog, "COLOR_SUPPORT", color_on)
+    monkeypatch.setattr(f_logger, "_useColor", color_on)
+    f_logger.setVerbosity(verbosity)
+    f_logger._consoleHandler.setStream(NullStream())
+    if file_on:
+        f_logger.enableFileHandler(True, f_file_path)
+
+    try:
+        base_peak, base_retained, _ = measure(lambda: empty("%s", f_message))
+        peak, retained, blocks = measure(lambda: f_logger.debug("%s", f_message), f_logger)
+    finally:
+        f_logger.enableFileHandler(False)
+
+    budget = f_allocation_budget[budget_key]
+    assert peak - base_peak <= budget["peak_bytes"]
+    assert retained - base_retained <= budget["retained_bytes"]
+    assert blocks <= budget["blocks"]
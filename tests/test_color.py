@@ -0,0 +1,153 @@
+import logging
+import sys
+
+import pytest
+
+import neatlog
+
+
+@pytest.fixture
+def f_format() -> str:
+    return "%(log_color)s%(levelname)s : %(funcName)s >> %(message)s"
+
+
+@pytest.fixture
+def f_colors() -> dict:
+    return {
+        'DEBUG':    'cyan',
+        'INFO':     'white',
+        'WARNING':  'yellow',
+        'ERROR':    'red',
+        'CRITICAL': 'red,bg_white',
+    }
+
+
+@pytest.fixture
+def f_record(f_level, f_message) -> logging.LogRecord:
+    return logging.LogRecord("MY_LOGGER", f_level, __file__, 1, f_message, None, None, "func")
+
+
+@pytest.mark.parametrize(
+    ["exc_info"],
+    [
+        [False],
+        [True],
+    ]
+)
+def test_color_formatter_matches_colorlog(
+        f_format,
+        f_colors,
+        f_record,
+        exc_info,
+):
+    colorlog = pytest.importorskip("colorlog")
+
+    if exc_info:
+        try:
+            1/0
+        except ZeroDivisionError:
+            f_record.exc_info = sys.exc_info()
+
+    expected = colorlog.ColoredFormatter(f_format, log_colors=f_colors).format(f_record)
+    f_record.exc_text = None
+    value = neatlog.neatlog.ColorFormatter(f_format, log_colors=f_colors, useColor=True).format(f_record)
+
+    assert value == expected
+
+
+def test_color_formatter_without_color(
+        f_format,
+        f_colors,
+        f_record,
+):
+    value = neatlog.neatlog.ColorFormatter(f_format, log_colors=f_colors, useColor=False).format(f_record)
+
+    assert value == logging.Formatter(f_format.replace("%(log_color)s", "")).format(f_record)
+    assert "\033[" not in value
+
+
+@pytest.mark.parametrize(
+    ["colors", "expected"],
+    [
+        ["", ""],
+        ["cyan", "\033[36m"],
+        ["red,bg_white", "\033[31m\033[47m"],
+        ["bold_green", "\033[01;32m"],
+        ["nonsense", ValueError],
+    ]
+)
+def test_parse_colors(
+        colors,
+        expected,
+):
+    if expected is ValueError:
+        with pytest.raises(expected):
+            neatlog.neatlog.parseColors(colors)
+    else:
+        assert neatlog.neatlog.parseColors(colors) == expected
+
+
+class TTY:
+    def isatty(self):
+        return True
+
+
+@pytest.mark.parametrize(
+    ["stream", "no_color", "expected"],
+    [
+        [TTY(), None, True],
+        [TTY(), "1", False],
+        [TTY(), "", True],
+        [object(), None, False],
+    ]
+)
+def test_get_color_support(
+        monkeypatch,
+        stream,
+        no_color,
+        expected,
+):
+    if no_color is None:
+        monkeypatch.delenv("NO_COLOR", raising=False)
+    else:
+        monkeypatch.setenv("NO_COLOR", no_color)
+
+    assert neatlog.neatlog.getColorSupport(stream) is expected
+
+
+def test_set_colors(
+        f_logger,
+):
+    f_logger.setColors({"DEBUG": "green"})
+
+    assert f_logger._consoleColors["DEBUG"] == "green"
+    assert f_logger._consoleFormatter.log_colors["DEBUG"] == "green"
+
+    with pytest.raises(ValueError):
+        f_logger.setColors({"DEBUG": "nonsense"})
+    assert f_logger._consoleColors["DEBUG"] == "green"
+
+
+@pytest.mark.parametrize(
+    ["backend", "expected"],
+    [
+        ["neatlog", neatlog.neatlog.ColorFormatter],
+        ["colorlog", "colorlog"],
+        ["nonsense", ValueError],
+    ]
+)
+def test_set_color_backend(
+        backend,
+        expected,
+        f_logger,
+):
+    if expected is ValueError:
+        with pytest.raises(expected):
+            f_logger.setColorBackend(backend)
+        return
+
+    if expected == "colorlog":
+        expected = pytest.importorskip("colorlog").ColoredFormatter
+
+    f_logger.setColorBackend(backend)
+    assert type(f_logger._consoleFormatter) is expected
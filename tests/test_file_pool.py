@@ -0,0 +1,77 @@
+import pytest
+
+import neatlog
+
+
+@pytest.fixture
+def f_other_logger(f_level) -> neatlog.neatlog._Logger:
+    return neatlog.neatlog._Logger("MY_OTHER_LOGGER", level=f_level)
+
+
+def test_shared_writer(
+        monkeypatch,
+        f_file_path,
+        f_header,
+        f_message,
+        f_logger,
+        f_other_logger,
+):
+    monkeypatch.setattr(f_logger, "getHeader", lambda: f_header)
+    monkeypatch.setattr(f_other_logger, "getHeader", lambda: f_header)
+
+    f_logger.enableFileHandler(True, f_file_path)
+    f_other_logger.enableFileHandler(True, f_file_path)
+
+    writer = neatlog.neatlog.FILE_POOL.get(f_file_path)
+    assert writer is f_logger._fileHandler._writer
+    assert writer is f_other_logger._fileHandler._writer
+    assert writer.refs == 2
+
+    f_logger.error(f_message)
+    f_other_logger.error(f_message)
+
+    f_logger.enableFileHandler(False)
+    assert writer.refs == 1
+    assert not writer.stream.closed
+
+    f_other_logger.enableFileHandler(False)
+    assert writer.stream.closed
+    assert neatlog.neatlog.FILE_POOL.get(f_file_path) is None
+
+    content = f_file_path.read_text()
+    assert content.count(f_header) == 1
+    assert content.startswith(f_header)
+    assert content.count(f_message) == 2
+
+
+@pytest.mark.parametrize(
+    ["existing", "expected"],
+    [
+        [None, True],
+        ["", True],
+        ["previous log\n", False],
+    ]
+)
+def test_header_only_for_new_file(
+        f_file_path,
+        f_header,
+        existing,
+        expected,
+):
+    if existing is not None:
+        f_file_path.write_text(existing)
+
+    writer = neatlog.neatlog.FILE_POOL.acquire(f_file_path, header=f_header)
+    neatlog.neatlog.FILE_POOL.release(writer)
+
+    assert (f_header in f_file_path.read_text()) is expected
+
+
+def test_resolve_path(
+        tmp_path,
+        f_file_name,
+):
+    link = tmp_path / "link"
+    link.symlink_to(tmp_path, target_is_directory=True)
+
+    assert neatlog.neatlog.resolvePath(link / f_file_name) == neatlog.neatlog.resolvePath(tmp_path / f_file_name)
@@ -0,0 +1,349 @@
+import datetime
+import logging
+import os
+
+import pytest
+
+import neatlog
+from neatlog import index
+from neatlog.__main__ import main
+
+
+@pytest.fixture
+def f_start() -> datetime.datetime:
+    return datetime.datetime(2025, 9, 15, 23, 59, 50)
+
+
+@pytest.fixture
+def f_header(f_start) -> str:
+    return "---- LOG ----\nFile  : test\nDate  : %s\nHost  : host01\nOS    : linux\n\n"%f_start
+
+
+@pytest.fixture
+def f_logger(monkeypatch, f_logger_name, f_header) -> neatlog.neatlog._Logger:
+    logger = neatlog.neatlog._Logger(f_logger_name, level="critical")
+    monkeypatch.setattr(logger, "getHeader", lambda: f_header)
+    yield logger
+    logger.enableFileHandler(False)
+
+
+def log(logger, level, message, created, exc_info=None):
+    record = logger.makeRecord(logger.name, level, __file__, 1, message, None, exc_info, "func")
+    record.created = created.timestamp()
+    record.msecs = 0
+    logger.handle(record)
+
+
+def log_all(logger, start):
+    # Crosses midnight to check that scanned dates roll over
+    for i, level in enumerate([logging.DEBUG, logging.ERROR, logging.INFO, logging.CRITICAL, logging.ERROR]):
+        log(logger, level, "message %s"%i, start + datetime.timedelta(seconds=5 * i))
+    try:
+        1/0
+    except ZeroDivisionError as e:
+        log(logger, logging.ERROR, "boom", start + datetime.timedelta(seconds=30), exc_info=(type(e), e, e.__traceback__))
+
+
+def messages(records):
+    return [r.split(b">> ")[1].split(b"\n")[0].decode() for r in records]
+
+
+@pytest.mark.parametrize(
+    ["indexed"],
+    [
+        [True],
+        [False],
+    ]
+)
+@pytest.mark.parametrize(
+    ["level", "since", "until", "expected"],
+    [
+        [logging.NOTSET, None, None, ["message 0", "message 1", "message 2", "message 3", "message 4", "boom"]],
+        [logging.ERROR, None, None, ["message 1", "message 3", "message 4", "boom"]],
+        [logging.NOTSET, datetime.datetime(2025, 9, 16, 0, 0, 0), None, ["message 2", "message 3", "message 4", "boom"]],
+        [logging.ERROR, datetime.datetime(2025, 9, 16), datetime.datetime(2025, 9, 16, 0, 0, 10), ["message 3", "message 4"]],
+    ]
+)
+def test_query(
+        f_file_path,
+        f_logger,
+        f_start,
+        indexed,
+        level,
+        since,
+        until,
+        expected,
+):
+    f_logger.enableFileHandler(True, f_file_path, index=indexed)
+    log_all(f_logger, f_start)
+    f_logger.enableFileHandler(False)
+
+    assert os.path.exists(index.indexPath(f_file_path)) is indexed
+
+    records = list(index.query(f_file_path, level=level, since=since, until=until))
+    assert messages(records) == expected
+    if "boom" in expected:
+        assert b"ZeroDivisionError" in records[-1]
+
+
+def test_query_index_matches_scan(
+        f_file_path,
+        f_logger,
+        f_start,
+):
+    f_logger.enableFileHandler(True, f_file_path, index=True)
+    log_all(f_logger, f_start)
+    f_logger.enableFileHandler(False)
+
+    indexed = list(index.query(f_file_path, level=logging.ERROR))
+    os.remove(index.indexPath(f_file_path))
+    scanned = list(index.query(f_file_path, level=logging.ERROR))
+
+    assert indexed == scanned
+
+
+def test_query_gaps(
+        f_file_path,
+        f_logger,
+        f_start,
+):
+    # Logged before the index existed
+    f_logger.enableFileHandler(True, f_file_path)
+    log(f_logger, logging.ERROR, "before", f_start)
+    f_logger.enableFileHandler(False)
+
+    f_logger.enableFileHandler(True, f_file_path, index=True)
+    log(f_logger, logging.ERROR, "indexed", f_start + datetime.timedelta(seconds=1))
+    f_logger.enableFileHandler(False)
+
+    # Logged while the index was off
+    f_logger.enableFileHandler(True, f_file_path)
+    log(f_logger, logging.ERROR, "unindexed", f_start + datetime.timedelta(seconds=2))
+    f_logger.enableFileHandler(False)
+
+    f_logger.enableFileHandler(True, f_file_path, index=True)
+    log(f_logger, logging.ERROR, "indexed again", f_start + datetime.timedelta(seconds=3))
+    f_logger.enableFileHandler(False)
+
+    records = list(index.query(f_file_path, level=logging.ERROR))
+    assert messages(records) == ["before", "indexed", "unindexed", "indexed again"]
+
+
+def test_build_index(
+        f_file_path,
+        f_logger,
+        f_start,
+):
+    f_logger.enableFileHandler(True, f_file_path)
+    log_all(f_logger, f_start)
+    f_logger.enableFileHandler(False)
+    scanned = list(index.query(f_file_path, level=logging.ERROR))
+
+    index.buildIndex(f_file_path)
+
+    assert os.path.getsize(index.indexPath(f_file_path)) == index.HEADER.size + 6 * index.ENTRY.size
+    # The records span two minutes
+    assert os.path.getsize(index.bucketPath(f_file_path)) == index.HEADER.size + 2 * index.BUCKET.size
+    assert list(index.query(f_file_path, level=logging.ERROR)) == scanned
+
+
+@pytest.mark.parametrize(
+    ["replacement"],
+    [
+        ["rotated"],
+        ["shorter"],
+    ]
+)
+def test_query_replaced_log(
+        f_file_path,
+        f_logger,
+        f_start,
+        replacement,
+):
+    f_logger.enableFileHandler(True, f_file_path, index=True)
+    log_all(f_logger, f_start)
+    f_logger.enableFileHandler(False)
+
+    # The index is left behind
+    os.rename(f_file_path, str(f_file_path) + ".1")
+    if replacement == "shorter":
+        f_logger.enableFileHandler(True, f_file_path)
+        log(f_logger, logging.ERROR, "unindexed", f_start)
+        f_logger.enableFileHandler(False)
+
+    f_logger.enableFileHandler(True, f_file_path, index=True)
+    log(f_logger, logging.ERROR, "new", f_start + datetime.timedelta(seconds=1))
+    f_logger.enableFileHandler(False)
+
+    expected = ["unindexed", "new"] if replacement == "shorter" else ["new"]
+    assert messages(index.query(f_file_path)) == expected
+
+
+@pytest.mark.parametrize(
+    ["path"],
+    [
+        [index.indexPath],
+        [index.bucketPath],
+    ]
+)
+@pytest.mark.parametrize(
+    ["content"],
+    [
+        [b""],
+        [b"NL"],
+    ]
+)
+def test_query_truncated_index(
+        f_file_path,
+        f_logger,
+        f_start,
+        path,
+        content,
+):
+    f_logger.enableFileHandler(True, f_file_path, index=True)
+    log_all(f_logger, f_start)
+    f_logger.enableFileHandler(False)
+    with open(path(f_file_path), 'wb') as f:
+        f.write(content)
+
+    assert messages(index.query(f_file_path, level=logging.CRITICAL)) == ["message 3"]
+
+    # Writing starts the index over
+    f_logger.enableFileHandler(True, f_file_path, index=True)
+    f_logger.enableFileHandler(False)
+    assert messages(index.query(f_file_path, level=logging.CRITICAL)) == ["message 3"]
+
+
+@pytest.mark.parametrize(
+    ["indexed"],
+    [
+        [True],
+        [False],
+    ]
+)
+@pytest.mark.parametrize(
+    ["since"],
+    [
+        [datetime.datetime(2025, 9, 16).astimezone()],
+        [datetime.datetime(2025, 9, 16).astimezone(datetime.timezone.utc)],
+    ]
+)
+def test_query_aware_time(
+        f_file_path,
+        f_logger,
+        f_start,
+        indexed,
+        since,
+):
+    f_logger.enableFileHandler(True, f_file_path, index=indexed)
+    log_all(f_logger, f_start)
+    f_logger.enableFileHandler(False)
+
+    records = index.query(f_file_path, since=since, until=since + datetime.timedelta(seconds=10))
+    assert messages(records) == ["message 2", "message 3", "message 4"]
+
+
+@pytest.mark.parametrize(
+    ["indexed"],
+    [
+        [True],
+        [False],
+    ]
+)
+@pytest.mark.parametrize(
+    ["since", "expected"],
+    [
+        [datetime.datetime(2025, 9, 15), ["day 1", "day 3", "day 5"]],
+        [datetime.datetime(2025, 9, 17), ["day 3", "day 5"]],
+        [datetime.datetime(2025, 9, 19), ["day 5"]],
+    ]
+)
+def test_query_days(
+        f_file_path,
+        f_logger,
+        f_start,
+        indexed,
+        since,
+        expected,
+):
+    # Days without records in one session and a later session appended to the file
+    f_logger.enableFileHandler(True, f_file_path, index=indexed)
+    log(f_logger, logging.ERROR, "day 1", f_start)
+    log(f_logger, logging.ERROR, "day 3", f_start + datetime.timedelta(days=2))
+    f_logger.enableFileHandler(False)
+    f_logger.enableFileHandler(True, f_file_path, index=indexed)
+    log(f_logger, logging.ERROR, "day 5", f_start + datetime.timedelta(days=4))
+    f_logger.enableFileHandler(False)
+
+    assert messages(index.query(f_file_path, since=since)) == expected
+
+
+def test_query_buckets(
+        f_file_path,
+        f_logger,
+        f_start,
+):
+    levels = [logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR, logging.CRITICAL]
+    f_logger.enableFileHandler(True, f_file_path, index=True)
+    for i in range(600):
+        # Mostly a few records per minute, critical ones are rare
+        level = levels[i % 4] if i % 97 else logging.CRITICAL
+        log(f_logger, level, "message %s"%i, f_start + datetime.timedelta(seconds=17 * i))
+    f_logger.enableFileHandler(False)
+
+    indexed = {}
+    for level in levels:
+        for minutes in [0, 1, 60, 100, 170]:
+            since = f_start + datetime.timedelta(minutes=minutes)
+            until = since + datetime.timedelta(minutes=30)
+            indexed[level, minutes] = list(index.query(f_file_path, level=level, since=since, until=until))
+            assert indexed[level, minutes] or minutes == 170
+
+    for path in [index.indexPath(f_file_path), index.bucketPath(f_file_path)]:
+        os.remove(path)
+    for (level, minutes), records in indexed.items():
+        since = f_start + datetime.timedelta(minutes=minutes)
+        until = since + datetime.timedelta(minutes=30)
+        assert list(index.query(f_file_path, level=level, since=since, until=until)) == records
+
+
+def test_index_recovers_open_bucket(
+        f_file_path,
+        f_logger,
+        f_start,
+):
+    f_logger.enableFileHandler(True, f_file_path)
+    f_logger.enableFileHandler(False)
+    size = os.path.getsize(f_file_path)
+    writer = index.IndexWriter(f_file_path, size)
+    for i in range(3):
+        writer.add(size, 0, logging.ERROR, (f_start + datetime.timedelta(minutes=i)).timestamp())
+    # Killed before the open bucket was written
+    writer.flush()
+    writer.stream.close()
+    writer.buckets.close()
+
+    writer = index.IndexWriter(f_file_path, size)
+    writer.close()
+
+    with open(index.bucketPath(f_file_path), 'rb') as f:
+        f.seek(index.HEADER.size)
+        buckets = list(index.BUCKET.iter_unpack(f.read()))
+    assert [b[2] for b in buckets] == [0, 1, 2, 3]
+    assert buckets[0][1] == index.GAP
+
+
+def test_main(
+        capfdbinary,
+        f_file_path,
+        f_logger,
+        f_start,
+):
+    f_logger.enableFileHandler(True, f_file_path, index=True)
+    log_all(f_logger, f_start)
+    f_logger.enableFileHandler(False)
+
+    main(["query", str(f_file_path), "--level", "critical", "--since", "2025-09-16T00:00:00"])
+
+    out = capfdbinary.readouterr().out
+    assert messages(out.splitlines(keepends=True)) == ["message 3"]
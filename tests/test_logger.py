@@ -1,10 +1,18 @@
+import gc
+import io
 import logging
+import math
+import threading
+import time
+import weakref
 from inspect import isclass
 from typing import Optional, Type
 
 import pytest
 from pytest_lazyfixture import lazy_fixture as lf
 
+import neatlog
+
 
 class TestLogger:
     def test_get_header(
@@ -209,3 +217,349 @@ class TestLogger:
         monkeypatch.setattr(f_logger, "_level", f_level)
         logger_method = f_get_logger_method(f_logger)
         logger_method(f_message)
+
+    @pytest.mark.parametrize(
+        ["console_on"],
+        [
+            [True],
+            [False],
+        ]
+    )
+    def test_update_log_methods(
+            self,
+            console_on,
+            f_level,
+            f_logger,
+    ):
+        f_logger.enableConsoleHandler(console_on)
+
+        for method_name, level in neatlog.neatlog.LOG_METHODS.items():
+            disabled = getattr(f_logger, method_name) is neatlog.neatlog._noop
+            assert disabled is (not console_on or level < f_level)
+
+        # Re-enabling restores the bound methods
+        f_logger.enableConsoleHandler(True)
+        f_logger.setLevel(logging.NOTSET)
+        for method_name in neatlog.neatlog.LOG_METHODS:
+            assert getattr(f_logger, method_name) == getattr(neatlog.neatlog._Logger, method_name).__get__(f_logger)
+
+    @pytest.mark.parametrize(
+        ["value", "expected"],
+        [
+            [None, None],
+            ["", None],
+            ["nonsense", None],
+            ["DEBUG", logging.DEBUG],
+            [" error ", logging.ERROR],
+            ["15", 15],
+        ]
+    )
+    def test_get_env_level(
+            self,
+            monkeypatch,
+            value,
+            expected,
+    ):
+        if value is None:
+            monkeypatch.delenv("NEATLOG_LEVEL", raising=False)
+        else:
+            monkeypatch.setenv("NEATLOG_LEVEL", value)
+
+        assert neatlog.neatlog.getEnvLevel() == expected
+
+    def test_env_level_overrides(
+            self,
+            monkeypatch,
+            f_logger_name,
+    ):
+        monkeypatch.setattr(neatlog.neatlog, "ENV_LEVEL", logging.CRITICAL)
+
+        logger = neatlog.neatlog._Logger(f_logger_name, level=logging.DEBUG)
+
+        assert logger._level == logging.CRITICAL
+        assert logger.error is neatlog.neatlog._noop
+
+    def test_timed(
+            self,
+            monkeypatch,
+            f_logger,
+            f_level,
+    ):
+        records = []
+        monkeypatch.setattr(f_logger, "_logTimings", lambda histogram, summary: records.append(summary))
+
+        with f_logger.timed("block", level="critical"):
+            pass
+
+        @f_logger.timed("function", level="critical")
+        def function(value):
+            return value
+
+        assert function(3) == 3
+        assert f_logger._timings["block"].count == 1
+        assert f_logger._timings["function"].count == 1
+
+        # Nothing is measured while the summary's level is disabled
+        f_logger.enableConsoleHandler(False)
+        with f_logger.timed("block"):
+            pass
+        function(3)
+        assert f_logger._timings["block"].count == 1
+        assert f_logger._timings["function"].count == 1
+
+        f_logger.flushTimings()
+        assert [summary[0] for summary in records] == [1, 1]
+        assert f_logger._timings["block"].count == 0
+
+    def test_timed_interval(
+            self,
+            monkeypatch,
+            f_logger,
+    ):
+        records = []
+        monkeypatch.setattr(f_logger, "_logTimings", lambda histogram, summary: records.append(summary))
+
+        for i in range(3):
+            with f_logger.timed("block", level="critical", interval=0):
+                pass
+
+        assert [summary[0] for summary in records] == [1, 1, 1]
+
+    def test_timed_invalid_level(
+            self,
+            f_logger,
+    ):
+        with pytest.raises(ValueError):
+            f_logger.timed("block", level="nonsense")
+
+    def test_timed_summary(
+            self,
+            monkeypatch,
+            f_logger,
+    ):
+        messages = []
+        monkeypatch.setattr(f_logger, "log", lambda level, msg, *args: messages.append((level, msg%args)))
+
+        histogram = f_logger.timed("block", level="error")._histogram
+        for duration in range(1, 1001):
+            histogram.add(duration * 1000, histogram.started)
+        f_logger.flushTimings()
+
+        assert messages == [(logging.ERROR, "block: count=1000 p50=524us p95=1ms p99=1ms max=1ms")]
+
+    @pytest.mark.parametrize(
+        ["durations"],
+        [
+            [list(range(0, 100))],
+            [[7] * 10],
+            [[10 ** i for i in range(12)]],
+            [[i * 997 for i in range(1, 5000)]],
+        ]
+    )
+    def test_histogram(
+            self,
+            durations,
+    ):
+        histogram = neatlog.neatlog._Histogram("block", logging.DEBUG, 60)
+        for duration in durations:
+            histogram.add(duration, histogram.started)
+
+        count, p50, p95, p99, maximum = histogram.reset()
+
+        ordered = sorted(durations)
+        assert count == len(durations)
+        assert maximum == ordered[-1]
+        for value, q in [(p50, 0.50), (p95, 0.95), (p99, 0.99)]:
+            exact = ordered[max(math.ceil(len(ordered) * q) - 1, 0)]
+            assert exact <= value <= max(exact * 1.25, exact + 1)
+        assert histogram.reset() is None
+
+    @pytest.mark.parametrize(
+        ["state", "expected"],
+        [
+            [None, ValueError],
+            [True, True],
+            [False, False],
+        ]
+    )
+    def test_enable_thread_buffering(
+            self,
+            state,
+            expected,
+            f_logger,
+    ):
+        if expected is ValueError:
+            with pytest.raises(expected):
+                f_logger.enableThreadBuffering(state)
+            return
+
+        f_logger.enableThreadBuffering(state)
+        assert (f_logger._threadBuffer is not None) is expected
+        f_logger.enableThreadBuffering(False)
+        assert f_logger._threadBuffer is None
+
+    def test_thread_buffering(
+            self,
+            monkeypatch,
+            f_file_path,
+            f_logger,
+    ):
+        stream = io.StringIO()
+        f_logger._consoleHandler.setStream(stream)
+        f_logger.setLevel("debug")
+        monkeypatch.setattr(f_logger, "_useColor", False)
+        f_logger.setVerbosity(0)
+        f_logger.enableFileHandler(True, f_file_path)
+        # Long interval, so the records are only written when turned off
+        f_logger.enableThreadBuffering(True, interval=60)
+
+        def work(i):
+            for j in range(100):
+                f_logger.info("thread %s record %s", i, j)
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert stream.getvalue() == ""
+
+        f_logger.enableThreadBuffering(False)
+        f_logger.enableFileHandler(False)
+
+        lines = stream.getvalue().splitlines()
+        assert len(lines) == 800
+        for i in range(8):
+            expected = ["INFO     >> thread %s record %s"%(i, j) for j in range(100)]
+            assert [line for line in lines if line.startswith("INFO     >> thread %s "%i)] == expected
+        assert f_file_path.read_text().count(" >> thread ") == 800
+
+    def test_update_log_methods_on_handler_level(
+            self,
+            f_message,
+            f_logger,
+    ):
+        stream = io.StringIO()
+        handler = logging.StreamHandler(stream)
+        handler.setLevel(logging.ERROR)
+        f_logger.addHandler(handler)
+        f_logger.enableConsoleHandler(False)
+        assert f_logger.debug is neatlog.neatlog._noop
+
+        handler.setLevel(logging.DEBUG)
+        assert f_logger.debug is not neatlog.neatlog._noop
+        f_logger.debug(f_message)
+        assert f_message in stream.getvalue()
+
+        # Removed handlers don't affect the logger anymore
+        f_logger.removeHandler(handler)
+        assert f_logger.debug is neatlog.neatlog._noop
+        handler.setLevel(logging.NOTSET)
+        assert f_logger.debug is neatlog.neatlog._noop
+
+    def test_histogram_interval_threads(
+            self,
+    ):
+        histogram = neatlog.neatlog._Histogram("block", logging.DEBUG, 0.001)
+        summaries = []
+
+        def work():
+            for i in range(2000):
+                summary = histogram.add(1000, time.perf_counter_ns())
+                if summary is not None:
+                    summaries.append(summary)
+
+        threads = [threading.Thread(target=work) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        last = histogram.reset()
+
+        # Every sample ends up in exactly one summary
+        counts = [summary[0] for summary in summaries] + ([last[0]] if last else [])
+        assert sum(counts) == 8 * 2000
+
+    def test_thread_buffering_remove_handler(
+            self,
+            monkeypatch,
+            f_logger_name,
+            f_file_path,
+    ):
+        errors = []
+        monkeypatch.setattr(logging.Handler, "handleError", lambda handler, record: errors.append(record))
+        # Only the file handler emits info, turning it off and on races with the flusher
+        logger = neatlog.neatlog._Logger(f_logger_name, level="critical")
+        logger.enableThreadBuffering(True, interval=0.001)
+        deadline = time.perf_counter() + 0.5
+
+        def work():
+            while time.perf_counter() < deadline:
+                logger.info("record")
+
+        threads = [threading.Thread(target=work) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        try:
+            while time.perf_counter() < deadline:
+                logger.enableFileHandler(True, f_file_path)
+                time.sleep(0.001)
+                logger.enableFileHandler(False)
+        finally:
+            for thread in threads:
+                thread.join()
+            logger.enableThreadBuffering(False)
+
+        assert errors == []
+
+    def test_thread_buffering_max_buffered(
+            self,
+            f_logger_name,
+    ):
+        stream = io.StringIO()
+        logger = neatlog.neatlog._Logger(f_logger_name, level="debug", color=False, verbosity=0)
+        logger._consoleHandler.setStream(stream)
+        # The flusher thread won't run during the test
+        logger.enableThreadBuffering(True, interval=60, maxBuffered=10)
+
+        for i in range(95):
+            logger.info("record %s", i)
+
+        assert len(logger._threadBuffer._local.queue) < 10
+        assert len(stream.getvalue().splitlines()) == 90
+        logger.enableThreadBuffering(False)
+        assert len(stream.getvalue().splitlines()) == 95
+
+    def test_timed_idle(
+            self,
+            monkeypatch,
+            f_logger_name,
+    ):
+        logger = neatlog.neatlog._Logger(f_logger_name)
+        records = []
+        monkeypatch.setattr(logger, "_logTimings", lambda histogram, summary: records.append(summary))
+
+        with logger.timed("block", level="critical", interval=0.2):
+            pass
+        assert logger in neatlog.neatlog._TIMED_LOGGERS
+
+        # Not due yet
+        neatlog.neatlog._flushTimings(due=True)
+        assert [summary for summary in records if summary] == []
+
+        # No more spans, the idle summary is logged anyway
+        time.sleep(0.25)
+        neatlog.neatlog._flushTimings(due=True)
+        assert [summary[0] for summary in records if summary] == [1]
+
+    def test_timed_logger_not_kept_alive(
+            self,
+            f_logger_name,
+    ):
+        logger = neatlog.neatlog._Logger(f_logger_name)
+        logger.timed("block")
+        ref = weakref.ref(logger)
+        del logger
+        gc.collect()
+
+        assert ref() is None